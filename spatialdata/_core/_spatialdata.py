@@ -714,6 +714,31 @@ class SpatialData:
             root = zarr.group(store=store)
             del root["table"]
 
+    def replace_table(self, table: AnnData) -> None:
+        """
+        Replace the table of a SpatialData object, or set it if no table is present.
+
+        Parameters
+        ----------
+        table
+            The new table.
+
+        Notes
+        -----
+        The table is validated before the current one is removed. If the SpatialData object is backed by a Zarr storage,
+        the table is written to the Zarr storage, replacing the previous one.
+        """
+        TableModel().validate(table)
+        self._table = table
+        if self.is_backed():
+            store = parse_url(self.path, mode="r+").store
+            root = zarr.group(store=store)
+            if "table" in root:
+                del root["table"]
+            # same layout as in write()
+            elem_group = root.create_group(name="table")
+            write_table(table=self.table, group=elem_group, name="table")
+
     @staticmethod
     def read(file_path: str) -> SpatialData:
         from spatialdata._io.read import read_zarr
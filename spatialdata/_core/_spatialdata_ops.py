@@ -23,6 +23,7 @@ from spatialdata._core.transformations import BaseTransformation, Identity, Sequ
 
 __all__ = [
     "set_transformation",
+    "set_transformations",
     "get_transformation",
     "remove_transformation",
     "get_transformation_between_coordinate_systems",
@@ -84,6 +85,38 @@ def set_transformation(
         write_to_sdata._write_transformations_to_disk(element)
 
 
+def set_transformations(
+    transformations: list[tuple[SpatialElement, BaseTransformation, str]],
+    write_to_sdata: Optional[SpatialData] = None,
+) -> None:
+    """
+    Set multiple transformations to one or more elements, in-memory or to disk.
+
+    The transformations of each element are updated at once, and, when writing to disk, each element is written once.
+
+    Parameters
+    ----------
+    transformations
+        The transformations to set, as a list of tuples `(element, transformation, to_coordinate_system)`.
+    write_to_sdata
+        The SpatialData object to set the transformations to. If None, the transformations are set in-memory. If not
+        None, the elements need to belong to the SpatialData object, and the SpatialData object needs to be backed.
+    """
+    # group the transformations by element; elements are not hashable, so they are identified by their id
+    elements: dict[int, SpatialElement] = {}
+    by_element: dict[int, dict[str, BaseTransformation]] = {}
+    for element, transformation, to_coordinate_system in transformations:
+        assert isinstance(transformation, BaseTransformation)
+        elements[id(element)] = element
+        by_element.setdefault(id(element), {})[to_coordinate_system] = transformation
+    for key, element in elements.items():
+        element_transformations = _get_transformations(element)
+        assert element_transformations is not None
+        set_transformation(
+            element, {**element_transformations, **by_element[key]}, set_all=True, write_to_sdata=write_to_sdata
+        )
+
+
 def get_transformation(
     element: SpatialElement, to_coordinate_system: Optional[str] = None, get_all: bool = False
 ) -> Union[BaseTransformation, dict[str, BaseTransformation]]:
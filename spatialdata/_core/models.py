@@ -1,8 +1,8 @@
 """This file contains models and schema for SpatialData"""
 from __future__ import annotations
 
-from collections.abc import Mapping, Sequence
-from functools import singledispatchmethod
+from collections.abc import Callable, Mapping, Sequence
+from functools import lru_cache, singledispatchmethod
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, Literal, Optional, Union
 
@@ -20,12 +20,12 @@ from multiscale_spatial_image.to_multiscale.to_multiscale import Methods
 from numpy.typing import NDArray
 from pandas.api.types import is_categorical_dtype
 from scipy.sparse import csr_matrix
+from shapely import get_parts
 from shapely._geometry import GeometryType
 from shapely.geometry import MultiPolygon, Point, Polygon
 from shapely.geometry.collection import GeometryCollection
 from shapely.io import from_geojson, from_ragged_array
 from spatial_image import SpatialImage, to_spatial_image
-from tqdm import tqdm
 from xarray import DataArray
 from xarray_schema.components import (
     ArrayTypeSchema,
@@ -64,6 +64,7 @@ Chunks_t = Union[
 ScaleFactors_t = Sequence[Union[dict[str, int], int]]
 
 Transform_s = AttrSchema(BaseTransformation, None)
+_POINTS_COORDINATES_DTYPES = frozenset(np.dtype(t) for t in (np.float32, np.float64, np.int64))
 
 
 __all__ = [
@@ -102,9 +103,23 @@ def _parse_transformations(
     _set_transformations(element, parsed_transformations)
 
 
+def _ensure_str_category(series: Union[pd.Series, dd.Series]) -> Union[pd.Series, dd.Series]:  # type: ignore[name-defined]
+    # a categorical with string categories is already in the expected format: avoid casting all the values to str
+    if isinstance(series.dtype, pd.CategoricalDtype) and series.dtype.categories.inferred_type == "string":
+        return series
+    return series.astype(str).astype("category")
+
+
 class RasterSchema(DataArraySchema):
     """Base schema for raster data."""
 
+    _dims_set: frozenset[str]
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        # the dims as a set, to compare them regardless of the order
+        cls._dims_set = frozenset(cls.dims.dims)
+
     @classmethod
     def parse(
         cls,
@@ -133,7 +148,7 @@ class RasterSchema(DataArraySchema):
         method
             Method to use for multiscale.
         chunks
-            Chunks to use for dask array.
+            Chunks to use for dask array, in the order of the dims of the model.
 
         Returns
         -------
@@ -142,12 +157,25 @@ class RasterSchema(DataArraySchema):
         """
         if "name" in kwargs:
             raise ValueError("The `name` argument is not (yet) supported for raster data.")
+        expected_dims = cls.dims.dims
+        # if the data is already a dask-backed spatial image with the model's dims, there is nothing to convert
+        if (
+            isinstance(data, SpatialImage)
+            and isinstance(data.data, DaskArray)
+            and tuple(data.dims) == expected_dims
+            and (dims is None or tuple(dims) == expected_dims)
+            and scale_factors is None
+            and len(kwargs) == 0
+        ):
+            # shallow copy (also of the attrs), so that the object passed by the user is not modified
+            out = data.copy(deep=False)
+            out.attrs = dict(data.attrs)
+            _parse_transformations(out, transformations)
+            return compute_coordinates(out)
         # if dims is specified inside the data, get the value of dims from the data
         if isinstance(data, DataArray) or isinstance(data, SpatialImage):
-            if not isinstance(data.data, DaskArray):  # numpy -> dask
-                data.data = from_array(data.data)
             if dims is not None:
-                if set(dims).symmetric_difference(data.dims):
+                if frozenset(dims) != frozenset(data.dims):
                     raise ValueError(
                         f"`dims`: {dims} does not match `data.dims`: {data.dims}, please specify the dims only once."
                     )
@@ -156,52 +184,59 @@ class RasterSchema(DataArraySchema):
             else:
                 dims = data.dims
             # but if dims don't match the model's dims, throw error
-            if set(dims).symmetric_difference(cls.dims.dims):
-                raise ValueError(f"Wrong `dims`: {dims}. Expected {cls.dims.dims}.")
+            if frozenset(dims) != cls._dims_set:
+                raise ValueError(f"Wrong `dims`: {dims}. Expected {expected_dims}.")
             _reindex = lambda d: d
         # if there are no dims in the data, use the model's dims or provided dims
         elif isinstance(data, np.ndarray) or isinstance(data, DaskArray):
-            if not isinstance(data, DaskArray):  # numpy -> dask
-                data = from_array(data)
             if dims is None:
-                dims = cls.dims.dims
+                dims = expected_dims
                 logger.info(f"no axes information specified in the object, setting `dims` to: {dims}")
             else:
-                if len(set(dims).symmetric_difference(cls.dims.dims)) > 0:
-                    raise ValueError(f"Wrong `dims`: {dims}. Expected {cls.dims.dims}.")
+                if frozenset(dims) != cls._dims_set:
+                    raise ValueError(f"Wrong `dims`: {dims}. Expected {expected_dims}.")
             _reindex = lambda d: dims.index(d)  # type: ignore[union-attr]
         else:
             raise ValueError(f"Unsupported data type: {type(data)}.")
 
         # transpose if possible
-        if dims != cls.dims.dims:
+        assert dims is not None
+        if tuple(dims) != expected_dims:
             try:
                 if isinstance(data, DataArray):
-                    data = data.transpose(*list(cls.dims.dims))
-                elif isinstance(data, DaskArray):
-                    data = data.transpose(*[_reindex(d) for d in cls.dims.dims])
+                    data = data.transpose(*expected_dims)
+                elif isinstance(data, (np.ndarray, DaskArray)):
+                    data = data.transpose(*[_reindex(d) for d in expected_dims])
                 else:
                     raise ValueError(f"Unsupported data type: {type(data)}.")
-                logger.info(f"Transposing `data` of type: {type(data)} to {cls.dims.dims}.")
+                logger.info(f"Transposing `data` of type: {type(data)} to {expected_dims}.")
             except ValueError:
                 raise ValueError(f"Cannot transpose arrays to match `dims`: {dims}. Try to reshape `data` or `dims`.")
 
+        # numpy -> dask, after the transpose, so that `chunks` refers to the dims of the model
+        if isinstance(data, DataArray):
+            if not isinstance(data.data, DaskArray):
+                # returns a new object, the data passed by the user is not modified
+                data = data.chunk(chunks if chunks is not None else "auto")
+        elif not isinstance(data, DaskArray):
+            data = from_array(data, chunks=chunks if chunks is not None else "auto")
+
         # finally convert to spatial image
-        data = to_spatial_image(array_like=data, dims=cls.dims.dims, **kwargs)
+        data = to_spatial_image(array_like=data, dims=expected_dims, **kwargs)
         # parse transformations
         _parse_transformations(data, transformations)
         # convert to multiscale if needed
         if scale_factors is not None:
-            parsed_transform = _get_transformations(data)
-            # delete transforms
-            del data.attrs["transform"]
+            # the transformations have already been validated above: take them out of the scale0 image and attach
+            # them to all the levels once the pyramid is built, without validating them again
+            parsed_transform = data.attrs.pop(TRANSFORM_KEY)
             data = to_multiscale(
                 data,
                 scale_factors=scale_factors,
                 method=method,
                 chunks=chunks,
             )
-            _parse_transformations(data, parsed_transform)
+            _set_transformations(data, parsed_transform)
         # recompute coordinates for (multiscale) spatial image
         data = compute_coordinates(data)
         return data
@@ -230,15 +265,18 @@ class RasterSchema(DataArraySchema):
 
     @validate.register(MultiscaleSpatialImage)
     def _(self, data: MultiscaleSpatialImage) -> None:
-        for j, k in zip(data.keys(), [f"scale{i}" for i in np.arange(len(data.keys()))]):
+        keys = list(data.keys())
+        for i, j in enumerate(keys):
+            k = f"scale{i}"
             if j != k:
                 raise ValueError(f"Wrong key for multiscale data, found: `{j}`, expected: `{k}`.")
-        name = {list(data[i].data_vars.keys())[0] for i in data.keys()}
-        if len(name) > 1:
-            raise ValueError(f"Wrong name for datatree: `{name}`.")
-        name = list(name)[0]
-        for d in data:
-            super().validate(data[d][name])
+        name = next(iter(data[keys[0]].data_vars))
+        for j in keys[1:]:
+            other_name = next(iter(data[j].data_vars))
+            if other_name != name:
+                raise ValueError(f"Wrong name for datatree, found: `{other_name}` in `{j}`, expected: `{name}`.")
+        for j in keys:
+            super().validate(data[j][name])
 
 
 class Labels2DModel(RasterSchema):
@@ -316,7 +354,7 @@ class ShapesModel:
             raise KeyError(f"GeoDataFrame must have a column named `{cls.GEOMETRY_KEY}`.")
         if not isinstance(data[cls.GEOMETRY_KEY], GeoSeries):
             raise ValueError(f"Column `{cls.GEOMETRY_KEY}` must be a GeoSeries.")
-        geom_ = data[cls.GEOMETRY_KEY].values[0]
+        geom_ = data[cls.GEOMETRY_KEY].iloc[0]
         if not isinstance(geom_, (Polygon, MultiPolygon, Point)):
             raise ValueError(
                 f"Column `{cls.GEOMETRY_KEY}` can only contain `Point`, `Polygon` or `MultiPolygon` shapes, but it contains {type(geom_)}."
@@ -378,13 +416,18 @@ class ShapesModel:
         radius: Optional[ArrayLike] = None,
         transformations: Optional[MappingToCoordinateSystem_t] = None,
     ) -> GeoDataFrame:
-        geometry = GeometryType(geometry)
-        data = from_ragged_array(geometry_type=geometry, coords=data, offsets=offsets)
-        geo_df = GeoDataFrame({"geometry": data})
-        if GeometryType(geometry).name == "POINT":
+        geometry_type = GeometryType(geometry)
+        data = from_ragged_array(geometry_type=geometry_type, coords=data, offsets=offsets)
+        geo_series = GeoSeries(data, copy=False)
+        if geometry_type.name == "POINT":
             if radius is None:
                 raise ValueError("If `geometry` is `Circles`, `radius` must be provided.")
-            geo_df[cls.RADIUS_KEY] = radius
+            if np.ndim(radius) > 0:
+                # the columns of the dict constructor must be 1-dimensional, e.g. a radius of shape (n, 1) is flattened
+                radius = np.asarray(radius).ravel()
+            geo_df = GeoDataFrame({cls.GEOMETRY_KEY: geo_series, cls.RADIUS_KEY: radius}, copy=False)
+        else:
+            geo_df = GeoDataFrame({cls.GEOMETRY_KEY: geo_series}, copy=False)
         _parse_transformations(geo_df, transformations)
         cls.validate(geo_df)
         return geo_df
@@ -406,7 +449,8 @@ class ShapesModel:
         gc: GeometryCollection = from_geojson(data.read_bytes(), **kwargs)
         if not isinstance(gc, GeometryCollection):
             raise ValueError(f"`{data}` does not contain a `GeometryCollection`.")
-        geo_df = GeoDataFrame({"geometry": gc.geoms})
+        # get_parts() extracts all the geometries of the collection at once, without iterating over them in Python
+        geo_df = GeoDataFrame({"geometry": get_parts(gc)})
         if isinstance(geo_df["geometry"][0], Point):
             if radius is None:
                 raise ValueError("If `geometry` is `Circles`, `radius` must be provided.")
@@ -441,19 +485,21 @@ class PointsModel:
 
     @classmethod
     def validate(cls, data: DaskDataFrame) -> None:
+        # only the dtypes are needed: read them from the dask metadata, no need to build a dask series per column
+        dtypes = getattr(data, "_meta", data).dtypes
         for ax in [X, Y, Z]:
-            if ax in data.columns:
-                assert data[ax].dtype in [np.float32, np.float64, np.int64]
+            if ax in dtypes.index:
+                assert dtypes[ax] in _POINTS_COORDINATES_DTYPES
         if cls.TRANSFORM_KEY not in data.attrs:
             raise ValueError(f":attr:`dask.dataframe.core.DataFrame.attrs` does not contain `{cls.TRANSFORM_KEY}`.")
         if cls.ATTRS_KEY in data.attrs:
             if "feature_key" in data.attrs[cls.ATTRS_KEY]:
                 feature_key = data.attrs[cls.ATTRS_KEY][cls.FEATURE_KEY]
-                if not is_categorical_dtype(data[feature_key]):
+                if not isinstance(dtypes.get(feature_key), pd.CategoricalDtype):
                     logger.info(f"Feature key `{feature_key}`could be of type `pd.Categorical`. Consider casting it.")
             if "instance_key" in data.attrs[cls.ATTRS_KEY]:
                 instance_key = data.attrs[cls.ATTRS_KEY][cls.INSTANCE_KEY]
-                if not is_categorical_dtype(data[instance_key]):
+                if not isinstance(dtypes.get(instance_key), pd.CategoricalDtype):
                     logger.info(
                         f"Instance key `{instance_key}` could be of type `pd.Categorical`. Consider casting it."
                     )
@@ -522,17 +568,17 @@ class PointsModel:
         assert len(data.shape) == 2
         ndim = data.shape[1]
         axes = [X, Y, Z][:ndim]
-        table: DaskDataFrame = dd.from_pandas(pd.DataFrame(data, columns=axes), **kwargs)  # type: ignore[attr-defined]
+        # assemble all the columns in pandas and convert to dask only once
+        pdf = pd.DataFrame(data, columns=axes)
         if annotation is not None:
             if feature_key is not None:
-                feature_categ = dd.from_pandas(  # type: ignore[attr-defined]
-                    annotation[feature_key].astype(str).astype("category"), **kwargs
-                )
-                table[feature_key] = feature_categ
+                pdf[feature_key] = _ensure_str_category(annotation[feature_key]).values
             if instance_key is not None:
-                table[instance_key] = annotation[instance_key]
-            for c in set(annotation.columns) - {feature_key, instance_key}:
-                table[c] = dd.from_pandas(annotation[c], **kwargs)  # type: ignore[attr-defined]
+                pdf[instance_key] = annotation[instance_key].values
+            for c in [c for c in annotation.columns if c not in {feature_key, instance_key}]:
+                pdf[c] = annotation[c].values
+        table: DaskDataFrame = dd.from_pandas(pdf, **kwargs)  # type: ignore[attr-defined]
+        if annotation is not None:
             return cls._add_metadata_and_validate(
                 table, feature_key=feature_key, instance_key=instance_key, transformations=transformations
             )
@@ -554,23 +600,31 @@ class PointsModel:
             kwargs["npartitions"] = cls.NPARTITIONS
         ndim = len(coordinates)
         axes = [X, Y, Z][:ndim]
+        # keep the order of the columns so that the resulting dataframe (and dask graph) is deterministic
+        skip_columns = {feature_key, instance_key, *coordinates.values()}
+        extra_columns = [c for c in data.columns if c not in skip_columns]
         if isinstance(data, pd.DataFrame):
-            table: DaskDataFrame = dd.from_pandas(  # type: ignore[attr-defined]
-                pd.DataFrame(data[[coordinates[ax] for ax in axes]].to_numpy(), columns=axes), **kwargs
+            # assemble all the columns in pandas and convert to dask only once
+            pdf = data[[coordinates[ax] for ax in axes]].rename(
+                columns={coordinates[ax]: ax for ax in axes}, copy=False
             )
+            pdf.index = pd.RangeIndex(len(pdf))
             if feature_key is not None:
-                feature_categ = dd.from_pandas(data[feature_key].astype(str).astype("category"), **kwargs)  # type: ignore[attr-defined]
-                table[feature_key] = feature_categ
+                pdf[feature_key] = _ensure_str_category(data[feature_key]).values
+            if instance_key is not None:
+                pdf[instance_key] = data[instance_key].values
+            for c in extra_columns:
+                pdf[c] = data[c].values
+            table: DaskDataFrame = dd.from_pandas(pdf, **kwargs)  # type: ignore[attr-defined]
         elif isinstance(data, dd.DataFrame):  # type: ignore[attr-defined]
             table = data[[coordinates[ax] for ax in axes]]
             table.columns = axes
             if feature_key is not None:
-                if data[feature_key].dtype.name != "category":
-                    table[feature_key] = data[feature_key].astype(str).astype("category")
-        if instance_key is not None:
-            table[instance_key] = data[instance_key]
-        for c in set(data.columns) - {feature_key, instance_key, *coordinates.values()}:
-            table[c] = data[c]
+                table[feature_key] = _ensure_str_category(data[feature_key])
+            if instance_key is not None:
+                table[instance_key] = data[instance_key]
+            for c in extra_columns:
+                table[c] = data[c]
         return cls._add_metadata_and_validate(
             table, feature_key=feature_key, instance_key=instance_key, transformations=transformations
         )
@@ -657,11 +711,18 @@ class TableModel:
         elif isinstance(region, list):
             if region_key is None:
                 raise ValueError(f"`{cls.REGION_KEY_KEY}` must be provided if `{cls.REGION_KEY}` is of type `List`.")
-            if not adata.obs[region_key].isin(region).all():
+            region_values = adata.obs[region_key]
+            is_categorical = isinstance(region_values.dtype, pd.CategoricalDtype)
+            if is_categorical and set(region_values.cat.categories).issubset(region):
+                # all the categories are valid regions, so it is enough to check for missing values
+                valid_region_values = not region_values.hasnans
+            else:
+                valid_region_values = region_values.isin(region).all()
+            if not valid_region_values:
                 raise ValueError(f"`adata.obs[{region_key}]` values do not match with `{cls.REGION_KEY}` values.")
-            if not is_categorical_dtype(adata.obs[region_key]):
+            if not is_categorical:
                 logger.warning(f"Converting `{cls.REGION_KEY_KEY}: {region_key}` to categorical dtype.")
-                adata.obs[region_key] = pd.Categorical(adata.obs[region_key])
+                adata.obs[region_key] = adata.obs[region_key].astype("category")
             if instance_key is None:
                 raise ValueError("`instance_key` must be provided if `region` is of type `List`.")
         else:
@@ -674,32 +735,61 @@ class TableModel:
         return adata
 
 
+# below this number of rows np.take is fast enough, and cheaper than importing numba and compiling the kernel
+_NUMBA_MIN_ROWS = 1_000_000
+
+
+def _codes_to_col_numpy(codes: NDArray[np.int_], lut: NDArray[np.int64], out: NDArray[np.int64]) -> None:
+    np.take(lut, codes, out=out)
+
+
+@lru_cache(maxsize=None)
+def _get_codes_to_col() -> Callable[[NDArray[np.int_], NDArray[np.int64], NDArray[np.int64]], None]:
+    # numba is optional and slow to import: it is imported (and the kernel compiled) only when first needed
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return _codes_to_col_numpy
+
+    @njit(cache=True, parallel=True, boundscheck=False)  # type: ignore[misc]
+    def _codes_to_col(codes: NDArray[np.int_], lut: NDArray[np.int64], out: NDArray[np.int64]) -> None:
+        for i in prange(codes.shape[0]):
+            out[i] = lut[codes[i]]
+
+    return _codes_to_col  # type: ignore[no-any-return]
+
+
 # TODO: consider removing if we settle with geodataframe
 def _sparse_matrix_from_assignment(
-    n_obs: int, var_names: Union[list[str], ArrayLike], assignment: pd.Series
+    n_obs: int, var_names: Union[list[str], ArrayLike, pd.Index], assignment: pd.Series
 ) -> csr_matrix:
     """Create a sparse matrix from an assignment array."""
     data: NDArray[np.bool_] = np.ones(len(assignment), dtype=bool)
     row = np.arange(len(assignment))
-    # if type(var_names) == np.ndarray:
-    #     assert len(var_names.shape) == 1
-    #     col = np.array([np.where(var_names == p)[0][0] for p in assignment])
-    if type(var_names) == list:
-        # naive way, slow
-        # values = []
-        # for p in tqdm(assignment, desc='creating sparse matrix'):
-        #     values.append(var_names.index(p))
-        # col = np.array(values)
-
-        # better way, ~10 times faster
-        col = np.full((len(assignment),), np.nan)
-        # tqdm not needed as a dependency if this function is removed
-        for cat in tqdm(assignment.cat.categories, desc="creating sparse matrix"):
-            value = var_names.index(cat)
-            col[assignment == cat] = value
-        assert np.sum(np.isnan(col)) == 0
+    if isinstance(var_names, (list, np.ndarray, pd.Index)):
+        # map each category to its column once (hash based lookup), then gather the columns through the codes
+        categories = assignment.cat.categories
+        var_index = pd.Index(var_names)
+        if var_index.is_unique:
+            lut = var_index.get_indexer(categories).astype(np.int64, copy=False)
+        else:
+            # as with list.index(), a category repeated in `var_names` is mapped to its first occurrence
+            first = ~var_index.duplicated(keep="first")
+            lut = var_index[first].get_indexer(categories).astype(np.int64, copy=False)
+            lut = np.where(lut < 0, lut, np.flatnonzero(first)[lut])
+        if np.any(lut < 0):
+            raise ValueError(f"Categories {categories[lut < 0].tolist()} of the assignment not found in `var_names`.")
+        codes = assignment.cat.codes.to_numpy()
+        if np.any(codes < 0):
+            raise ValueError("The assignment contains missing values.")
+        col = np.empty(len(codes), dtype=np.int64)
+        if len(codes) >= _NUMBA_MIN_ROWS:
+            # a single dtype for the codes, so that the kernel is compiled only once
+            _get_codes_to_col()(codes.astype(np.intp, copy=False), lut, col)
+        else:
+            _codes_to_col_numpy(codes, lut, col)
     else:
-        raise TypeError(f"var_names must be either np.array or List, but got {type(var_names)}")
+        raise TypeError(f"var_names must be either np.array, pd.Index or List, but got {type(var_names)}")
     sparse = csr_matrix((data, (row, col)), shape=(n_obs, len(var_names)))
     return sparse
 
@@ -715,6 +805,13 @@ Schema_t = Union[
 ]
 
 
+# the schemas are stateless, so a single instance of each can be reused for validation
+_SCHEMAS: dict[Schema_t, Any] = {
+    schema: schema()
+    for schema in (Image2DModel, Image3DModel, Labels2DModel, Labels3DModel, PointsModel, ShapesModel, TableModel)
+}
+
+
 def get_schema(
     e: SpatialElement,
 ) -> Schema_t:
@@ -722,7 +819,7 @@ def get_schema(
         schema: Schema_t,
         e: Union[SpatialElement],
     ) -> Schema_t:
-        schema().validate(e)
+        _SCHEMAS[schema].validate(e)
         return schema
 
     if isinstance(e, SpatialImage) or isinstance(e, MultiscaleSpatialImage):
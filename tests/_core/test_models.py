@@ -1,11 +1,13 @@
 import os
 import pathlib
+import sys
 import tempfile
 from copy import deepcopy
 from functools import partial
 from pathlib import Path
 from typing import Any, Callable, Optional, Union
 
+import dask.array
 import dask.array.core
 import dask.dataframe as dd
 import numpy as np
@@ -23,6 +25,7 @@ from spatial_image import SpatialImage, to_spatial_image
 from xarray import DataArray
 
 from spatialdata import SpatialData
+from spatialdata._core import models
 from spatialdata._core._spatialdata_ops import get_transformation, set_transformation
 from spatialdata._core.core_utils import (
     _set_transformations,
@@ -37,9 +40,12 @@ from spatialdata._core.models import (
     RasterSchema,
     ShapesModel,
     TableModel,
+    _codes_to_col_numpy,
+    _get_codes_to_col,
+    _sparse_matrix_from_assignment,
     get_schema,
 )
-from spatialdata._core.transformations import Scale
+from spatialdata._core.transformations import Identity, Scale
 from spatialdata._types import ArrayLike
 from tests._core.conftest import MULTIPOLYGON_PATH, POINT_PATH, POLYGON_PATH
 from tests.conftest import (
@@ -168,6 +174,9 @@ class TestModels:
         image = converter(image)
         self._parse_transformation_from_multiple_places(model, image)
         spatial_image = model.parse(image)
+        if isinstance(image, DataArray):
+            # the parser must not replace the numpy array of the object passed by the user
+            assert isinstance(image.data, np.ndarray)
         if model in [Image2DModel, Image3DModel]:
             element_type = "image"
         elif model in [Labels2DModel, Labels3DModel]:
@@ -189,6 +198,29 @@ class TestModels:
             with pytest.raises(ValueError):
                 model.parse(image, **kwargs)
 
+    def test_raster_schema_dask_spatial_image(self) -> None:
+        image = to_spatial_image(dask.array.zeros((3, 8, 8)), dims=("c", "y", "x"), name="my_image")
+        parsed0 = Image2DModel.parse(image, transformations={"a": Identity()})
+        parsed1 = Image2DModel.parse(image, transformations={"b": Scale([2.0], axes=("x",))})
+        # the object passed by the user is not modified
+        assert "transform" not in image.attrs
+        assert image.name == "my_image"
+        assert parsed0 is not image
+        assert set(get_transformation(parsed0, get_all=True).keys()) == {"a"}
+        assert set(get_transformation(parsed1, get_all=True).keys()) == {"b"}
+        assert isinstance(parsed0, SpatialImage)
+        assert parsed0.data is image.data
+
+    @pytest.mark.parametrize("converter", [lambda _: _, partial(DataArray, dims=("y", "x", "c"))])
+    def test_raster_schema_chunks(self, converter: Callable[..., Any]) -> None:
+        # the chunks refer to the dims of the model, also when the data needs to be transposed
+        image = converter(np.zeros((4, 6, 3)))
+        parsed = Image2DModel.parse(
+            image, dims=("y", "x", "c") if isinstance(image, np.ndarray) else None, chunks=(1, 2, 3)
+        )
+        assert parsed.dims == ("c", "y", "x")
+        assert parsed.data.chunks == ((1, 1, 1), (2, 2), (3, 3))
+
     @pytest.mark.parametrize("model", [ShapesModel])
     @pytest.mark.parametrize("path", [POLYGON_PATH, MULTIPOLYGON_PATH, POINT_PATH])
     def test_shapes_model(self, model: ShapesModel, path: Path) -> None:
@@ -333,3 +365,83 @@ def test_get_schema():
         assert schema == ShapesModel
     schema = get_schema(table)
     assert schema == TableModel
+
+
+def test_shapes_model_ragged_array_radius() -> None:
+    coords = RNG.normal(size=(3, 2))
+    # the radius can also be a column vector, as for the radii of the circles in the test fixtures
+    for radius in (np.ones((3,)), np.ones((3, 1)), 1.0):
+        circles = ShapesModel.parse(coords, geometry=0, radius=radius)
+        assert circles[ShapesModel.RADIUS_KEY].shape == (3,)
+        np.testing.assert_array_equal(circles[ShapesModel.RADIUS_KEY], np.ones((3,)))
+
+
+def test_sparse_matrix_from_assignment():
+    var_names = ["a", "b", "c"]
+    assignment = pd.Series(RNG.choice(["c", "a"], size=100)).astype("category")
+    for v in (var_names, np.array(var_names), pd.Index(var_names)):
+        sparse = _sparse_matrix_from_assignment(n_obs=100, var_names=v, assignment=assignment)
+        assert sparse.shape == (100, 3)
+        np.testing.assert_array_equal(sparse.indices, [var_names.index(a) for a in assignment])
+    with pytest.raises(ValueError):
+        _sparse_matrix_from_assignment(n_obs=100, var_names=["a", "b"], assignment=assignment)
+    # repeated var names: the first occurrence is used
+    var_names = ["a", "b", "a", "c"]
+    sparse = _sparse_matrix_from_assignment(
+        n_obs=3, var_names=var_names, assignment=pd.Series(["a", "b", "a"]).astype("category")
+    )
+    assert sparse.shape == (3, 4)
+    np.testing.assert_array_equal(sparse.indices, [0, 1, 0])
+
+
+def test_sparse_matrix_from_assignment_small_without_numba_kernel() -> None:
+    _get_codes_to_col.cache_clear()
+    assignment = pd.Series(RNG.choice(["c", "a"], size=100)).astype("category")
+    _sparse_matrix_from_assignment(n_obs=100, var_names=["a", "b", "c"], assignment=assignment)
+    # small assignments don't need numba: the kernel is not even requested
+    assert _get_codes_to_col.cache_info().misses == 0
+
+
+def test_sparse_matrix_from_assignment_without_numba(monkeypatch: pytest.MonkeyPatch) -> None:
+    # a None entry in sys.modules makes the import of numba fail
+    monkeypatch.setitem(sys.modules, "numba", None)
+    # take the path of the large assignments also for this small one
+    monkeypatch.setattr(models, "_NUMBA_MIN_ROWS", 0)
+    _get_codes_to_col.cache_clear()
+    try:
+        assert _get_codes_to_col() is _codes_to_col_numpy
+        var_names = ["a", "b", "c"]
+        assignment = pd.Series(RNG.choice(["c", "a"], size=100)).astype("category")
+        sparse = _sparse_matrix_from_assignment(n_obs=100, var_names=var_names, assignment=assignment)
+        np.testing.assert_array_equal(sparse.indices, [var_names.index(a) for a in assignment])
+    finally:
+        _get_codes_to_col.cache_clear()
+
+
+@pytest.mark.parametrize("typ", [np.ndarray, pd.DataFrame, dd.DataFrame])
+def test_points_model_categorical_feature_key(typ: Any) -> None:
+    data = pd.DataFrame(RNG.normal(size=(10, 2)), columns=["A", "B"])
+    data["target"] = pd.Categorical(RNG.choice(["a", "b"], size=(10,)))
+    genes = data["target"].tolist()
+    if typ == np.ndarray:
+        points = PointsModel.parse(data[["A", "B"]].to_numpy(), annotation=data, feature_key="target")
+    else:
+        if typ == dd.DataFrame:
+            data = dd.from_pandas(data, npartitions=2)
+        points = PointsModel.parse(data, coordinates={"x": "A", "y": "B"}, feature_key="target")
+    assert is_categorical_dtype(points["target"])
+    assert points["target"].compute().tolist() == genes
+
+
+def test_table_model_categorical_region_key() -> None:
+    obs = pd.DataFrame({"instance_id": np.arange(10)})
+    obs["region"] = pd.Categorical(RNG.choice(["a", "b"], size=(10,)), categories=["a", "b", "c"])
+    adata = AnnData(RNG.normal(size=(10, 2)), obs=obs)
+    # the unused category "c" is not a region, but all the values are
+    TableModel.parse(adata, region=["a", "b"], region_key="region", instance_key="instance_id")
+    del adata.uns[TableModel.ATTRS_KEY]
+    with pytest.raises(ValueError):
+        TableModel.parse(adata, region=["a"], region_key="region", instance_key="instance_id")
+    adata.obs["region"].iloc[0] = np.nan
+    with pytest.raises(ValueError):
+        TableModel.parse(adata, region=["a", "b", "c"], region_key="region", instance_key="instance_id")
@@ -1,8 +1,11 @@
+from typing import Any
+
+import dask
 import numpy as np
+import pandas as pd
 import pytest
 from anndata import AnnData
 from dask.dataframe.core import DataFrame as DaskDataFrame
-from dask.delayed import Delayed
 from geopandas import GeoDataFrame
 from multiscale_spatial_image import MultiscaleSpatialImage
 from spatial_image import SpatialImage
@@ -11,27 +14,50 @@ from spatialdata import SpatialData
 from spatialdata._core._spatialdata_ops import (
     _concatenate_tables,
     concatenate,
-    set_transformation,
+    get_transformation,
+    set_transformations,
 )
+from spatialdata._core.core_utils import SpatialElement
 from spatialdata._core.models import TableModel
 from spatialdata._core.transformations import Identity, Scale
 from tests.conftest import _get_table
 
+# the length of a dask dataframe is computed once per graph: the keys identify the graph that produces the dataframe
+_LEN_CACHE: dict[tuple[Any, ...], int] = {}
+
+
+def _ddf_len(ddf: DaskDataFrame) -> int:
+    key = tuple(ddf.__dask_keys__())
+    if key not in _LEN_CACHE:
+        _LEN_CACHE[key] = int(ddf.shape[0].compute())
+    return _LEN_CACHE[key]
+
+
+def _cache_ddf_lens(*elements_per_sdata: tuple[tuple[str, str, SpatialElement], ...]) -> None:
+    # submit all the missing lengths together, so that dask can schedule (and share) the graphs in a single call
+    to_compute = {}
+    for elements in elements_per_sdata:
+        for _, _, element in elements:
+            if isinstance(element, DaskDataFrame):
+                key = tuple(element.__dask_keys__())
+                if key not in _LEN_CACHE:
+                    to_compute[key] = element.shape[0]
+    lengths = dask.compute(*to_compute.values(), scheduler="threads")
+    _LEN_CACHE.update(zip(to_compute.keys(), (int(n) for n in lengths)))
+
 
-def _assert_elements_left_to_right_seem_identical(sdata0: SpatialData, sdata1: SpatialData):
-    for element_type, element_name, element in sdata0._gen_elements():
+def _assert_elements_left_to_right_seem_identical(
+    elements0: tuple[tuple[str, str, SpatialElement], ...], sdata1: SpatialData
+):
+    for element_type, element_name, element in elements0:
         elements = sdata1.__getattribute__(element_type)
         assert element_name in elements
         element1 = elements[element_name]
         if isinstance(element, AnnData) or isinstance(element, SpatialImage) or isinstance(element, GeoDataFrame):
             assert element.shape == element1.shape
         elif isinstance(element, DaskDataFrame):
-            for s0, s1 in zip(element.shape, element1.shape):
-                if isinstance(s0, Delayed):
-                    s0 = s0.compute()
-                if isinstance(s1, Delayed):
-                    s1 = s1.compute()
-                assert s0 == s1
+            assert _ddf_len(element) == _ddf_len(element1)
+            assert len(element.columns) == len(element1.columns)
         elif isinstance(element, MultiscaleSpatialImage):
             assert len(element) == len(element1)
         else:
@@ -39,15 +65,19 @@ def _assert_elements_left_to_right_seem_identical(sdata0: SpatialData, sdata1: S
 
 
 def _assert_tables_seem_identical(table0: AnnData, table1: AnnData):
-    assert table0.shape == table1.shape
+    assert len(table0.obs) == len(table1.obs)
+    assert len(table0.var) == len(table1.var)
 
 
 def _assert_spatialdata_objects_seem_identical(sdata0: SpatialData, sdata1: SpatialData):
     # this is not a full comparison, but it's fine anyway
-    assert len(list(sdata0._gen_elements())) == len(list(sdata1._gen_elements()))
+    elements0 = tuple(sdata0._gen_elements())
+    elements1 = tuple(sdata1._gen_elements())
+    assert len(elements0) == len(elements1)
     assert set(sdata0.coordinate_systems) == set(sdata1.coordinate_systems)
-    _assert_elements_left_to_right_seem_identical(sdata0, sdata1)
-    _assert_elements_left_to_right_seem_identical(sdata1, sdata0)
+    _cache_ddf_lens(elements0, elements1)
+    _assert_elements_left_to_right_seem_identical(elements0, sdata1)
+    _assert_elements_left_to_right_seem_identical(elements1, sdata0)
     _assert_tables_seem_identical(sdata0.table, sdata1.table)
 
 
@@ -56,9 +86,13 @@ def test_filter_by_coordinate_system(full_sdata):
     _assert_spatialdata_objects_seem_identical(sdata, full_sdata)
 
     scale = Scale([2.0], axes=("x",))
-    set_transformation(full_sdata.images["image2d"], scale, "my_space0")
-    set_transformation(full_sdata.shapes["circles"], Identity(), "my_space0")
-    set_transformation(full_sdata.shapes["poly"], Identity(), "my_space1")
+    set_transformations(
+        [
+            (full_sdata.images["image2d"], scale, "my_space0"),
+            (full_sdata.shapes["circles"], Identity(), "my_space0"),
+            (full_sdata.shapes["poly"], Identity(), "my_space1"),
+        ]
+    )
 
     sdata_my_space = full_sdata.filter_by_coordinate_system(coordinate_system="my_space0", filter_table=False)
     assert len(list(sdata_my_space._gen_elements())) == 2
@@ -70,29 +104,41 @@ def test_filter_by_coordinate_system(full_sdata):
     assert len(list(sdata_my_space1._gen_elements())) == 3
 
 
-def test_filter_by_coordinate_system_also_table(full_sdata):
+def test_filter_by_coordinate_system_also_table(light_sdata):
     from spatialdata._core.models import TableModel
 
-    full_sdata.table.obs["annotated_shapes"] = np.random.choice(
-        ["shapes/circles", "shapes/poly"], size=full_sdata.table.shape[0]
+    light_sdata.table.obs["annotated_shapes"] = pd.Categorical.from_codes(
+        np.random.randint(0, 2, size=light_sdata.table.shape[0], dtype=np.int8),
+        categories=["shapes/circles", "shapes/poly"],
     )
-    adata = full_sdata.table
+    adata = light_sdata.table
     del adata.uns[TableModel.ATTRS_KEY]
-    del full_sdata.table
-    full_sdata.table = TableModel.parse(
-        adata, region=["shapes/circles", "shapes/poly"], region_key="annotated_shapes", instance_key="instance_id"
+    light_sdata.replace_table(
+        TableModel.parse(
+            adata, region=["shapes/circles", "shapes/poly"], region_key="annotated_shapes", instance_key="instance_id"
+        )
     )
 
     scale = Scale([2.0], axes=("x",))
-    set_transformation(full_sdata.shapes["circles"], scale, "my_space0")
-    set_transformation(full_sdata.shapes["poly"], scale, "my_space1")
+    set_transformations(
+        [(light_sdata.shapes["circles"], scale, "my_space0"), (light_sdata.shapes["poly"], scale, "my_space1")]
+    )
+
+    filtered_sdata0 = light_sdata.filter_by_coordinate_system(coordinate_system="my_space0")
+    filtered_sdata1 = light_sdata.filter_by_coordinate_system(coordinate_system="my_space1")
+    filtered_sdata2 = light_sdata.filter_by_coordinate_system(coordinate_system="my_space0", filter_table=False)
 
-    filtered_sdata0 = full_sdata.filter_by_coordinate_system(coordinate_system="my_space0")
-    filtered_sdata1 = full_sdata.filter_by_coordinate_system(coordinate_system="my_space1")
-    filtered_sdata2 = full_sdata.filter_by_coordinate_system(coordinate_system="my_space0", filter_table=False)
+    assert len(filtered_sdata0.table) + len(filtered_sdata1.table) == len(light_sdata.table)
+    assert len(filtered_sdata2.table) == len(light_sdata.table)
 
-    assert len(filtered_sdata0.table) + len(filtered_sdata1.table) == len(full_sdata.table)
-    assert len(filtered_sdata2.table) == len(full_sdata.table)
+
+def test_set_transformations(light_sdata):
+    scale = Scale([2.0], axes=("x",))
+    circles = light_sdata.shapes["circles"]
+    set_transformations([(circles, scale, "my_space0"), (circles, Identity(), "my_space1")])
+    assert set(get_transformation(circles, get_all=True).keys()) == {"global", "my_space0", "my_space1"}
+    assert get_transformation(circles, "my_space0") == scale
+    assert set(get_transformation(light_sdata.shapes["poly"], get_all=True).keys()) == {"global"}
 
 
 def test_concatenate_tables():
@@ -112,12 +158,11 @@ def test_concatenate_tables():
     assert len(c0) == len(table0) + len(table1)
 
     d = c0.uns[TableModel.ATTRS_KEY]
-    d["region"] = sorted(d["region"])
-    assert d == {
-        "region": ["shapes/circles", "shapes/poly"],
-        "region_key": "annotated_element_merged_1",
-        "instance_key": "instance_id",
-    }
+    assert set(d.keys()) == {"region", "region_key", "instance_key"}
+    assert len(d["region"]) == 2
+    assert set(d["region"]) == {"shapes/circles", "shapes/poly"}
+    assert d["region_key"] == "annotated_element_merged_1"
+    assert d["instance_key"] == "instance_id"
 
     ##
     table3 = _get_table(region="shapes/circles", region_key="annotated_shapes_other", instance_key="instance_id")
@@ -146,22 +191,26 @@ def test_concatenate_tables():
         _concatenate_tables([table4, table6])
 
 
-def test_concatenate_sdatas(full_sdata):
+def test_concatenate_sdatas(light_sdata):
     with pytest.raises(RuntimeError):
-        concatenate([full_sdata, SpatialData(images={"image2d": full_sdata.images["image2d"]})])
+        concatenate([light_sdata, SpatialData(images={"image2d": light_sdata.images["image2d"]})])
     with pytest.raises(RuntimeError):
-        concatenate([full_sdata, SpatialData(labels={"labels2d": full_sdata.labels["labels2d"]})])
+        concatenate([light_sdata, SpatialData(labels={"labels2d": light_sdata.labels["labels2d"]})])
     with pytest.raises(RuntimeError):
-        concatenate([full_sdata, SpatialData(points={"points_0": full_sdata.points["points_0"]})])
+        concatenate([light_sdata, SpatialData(points={"points_0": light_sdata.points["points_0"]})])
     with pytest.raises(RuntimeError):
-        concatenate([full_sdata, SpatialData(shapes={"circles": full_sdata.shapes["circles"]})])
+        concatenate([light_sdata, SpatialData(shapes={"circles": light_sdata.shapes["circles"]})])
 
-    assert concatenate([full_sdata, SpatialData()]).table is not None
-    assert concatenate([full_sdata, SpatialData()], omit_table=True).table is None
+    assert concatenate([light_sdata, SpatialData()]).table is not None
+    assert concatenate([light_sdata, SpatialData()], omit_table=True).table is None
 
-    set_transformation(full_sdata.shapes["circles"], Identity(), "my_space0")
-    set_transformation(full_sdata.shapes["poly"], Identity(), "my_space1")
-    filtered = full_sdata.filter_by_coordinate_system(coordinate_system=["my_space0", "my_space1"], filter_table=False)
+    set_transformations(
+        [
+            (light_sdata.shapes["circles"], Identity(), "my_space0"),
+            (light_sdata.shapes["poly"], Identity(), "my_space1"),
+        ]
+    )
+    filtered = light_sdata.filter_by_coordinate_system(coordinate_system=["my_space0", "my_space1"], filter_table=False)
     assert len(list(filtered._gen_elements())) == 2
     filtered0 = filtered.filter_by_coordinate_system(coordinate_system="my_space0", filter_table=False)
     filtered1 = filtered.filter_by_coordinate_system(coordinate_system="my_space1", filter_table=False)
@@ -169,13 +218,13 @@ def test_concatenate_sdatas(full_sdata):
     assert len(list(concatenated._gen_elements())) == 2
 
 
-def test_locate_spatial_element(full_sdata):
-    assert full_sdata._locate_spatial_element(full_sdata.images["image2d"]) == ("image2d", "images")
-    im = full_sdata.images["image2d"]
-    del full_sdata.images["image2d"]
+def test_locate_spatial_element(light_sdata):
+    assert light_sdata._locate_spatial_element(light_sdata.images["image2d"]) == ("image2d", "images")
+    im = light_sdata.images["image2d"]
+    del light_sdata.images["image2d"]
     with pytest.raises(ValueError, match="Element not found in the SpatialData object."):
-        full_sdata._locate_spatial_element(im)
-    full_sdata.images["image2d"] = im
-    full_sdata.images["image2d_again"] = im
+        light_sdata._locate_spatial_element(im)
+    light_sdata.images["image2d"] = im
+    light_sdata.images["image2d_again"] = im
     with pytest.raises(ValueError):
-        full_sdata._locate_spatial_element(im)
+        light_sdata._locate_spatial_element(im)
@@ -168,6 +168,11 @@ class TestReadWrite:
             s3 = SpatialData.read(f2)
             assert len(s3.table) == len(s2.table)
 
+            # replacing the table of a backed object writes it to disk
+            s3.replace_table(t)
+            s4 = SpatialData.read(f2)
+            assert len(s4.table) == len(t)
+
 
 def test_io_and_lazy_loading_points(points):
     elem_name = list(points.points.keys())[0]
@@ -1,18 +1,24 @@
+from copy import deepcopy
 from typing import Optional, Union
 
 import numpy as np
 import pandas as pd
 import pytest
+import shapely
 from anndata import AnnData
 from dask.dataframe.core import DataFrame as DaskDataFrame
 from geopandas import GeoDataFrame
 from multiscale_spatial_image import MultiscaleSpatialImage
 from numpy.random import default_rng
-from shapely.geometry import MultiPolygon, Point, Polygon
 from spatial_image import SpatialImage
 from xarray import DataArray
 
 from spatialdata import SpatialData
+from spatialdata._core.core_utils import (
+    SpatialElement,
+    _get_transformations,
+    _set_transformations,
+)
 from spatialdata._core.models import (
     Image2DModel,
     Image3DModel,
@@ -25,6 +31,14 @@ from spatialdata._core.models import (
 
 RNG = default_rng()
 
+# the random values of the images are drawn once (in float32) and shared by all the calls of _get_images()
+_IMAGE_2D = RNG.standard_normal(size=(3, 64, 64), dtype=np.float32)
+_IMAGE_3D = RNG.standard_normal(size=(2, 64, 64, 3), dtype=np.float32)
+
+
+def _random_labels(shape: tuple[int, ...]) -> np.ndarray:
+    return RNG.integers(0, 256, size=shape, dtype=np.uint8)
+
 
 @pytest.fixture()
 def images() -> SpatialData:
@@ -68,8 +82,8 @@ def tables() -> list[AnnData]:
     return _tables
 
 
-@pytest.fixture()
-def full_sdata() -> SpatialData:
+@pytest.fixture(scope="session")
+def _full_sdata_template() -> SpatialData:
     return SpatialData(
         images=_get_images(),
         labels=_get_labels(),
@@ -79,6 +93,26 @@ def full_sdata() -> SpatialData:
     )
 
 
+@pytest.fixture()
+def full_sdata(_full_sdata_template: SpatialData) -> SpatialData:
+    # the tests modify the object (e.g. transformations, elements, table), so each test gets its own copy
+    return _deepcopy_sdata(_full_sdata_template)
+
+
+@pytest.fixture()
+def light_sdata(_full_sdata_template: SpatialData) -> SpatialData:
+    # like full_sdata, but with one single-scale and one multiscale raster per type (no xarray or 3D multiscale variants)
+    return _deepcopy_sdata(
+        SpatialData(
+            images={k: _full_sdata_template.images[k] for k in ("image2d", "image2d_multiscale", "image3d_numpy")},
+            labels={k: _full_sdata_template.labels[k] for k in ("labels2d", "labels2d_multiscale", "labels3d_numpy")},
+            shapes=_full_sdata_template.shapes,
+            points=_full_sdata_template.points,
+            table=_full_sdata_template.table,
+        )
+    )
+
+
 # @pytest.fixture()
 # def empty_points() -> SpatialData:
 #     geo_df = GeoDataFrame(
@@ -105,13 +139,7 @@ def empty_table() -> SpatialData:
 )
 def sdata(request) -> SpatialData:
     if request.param == "full":
-        s = SpatialData(
-            images=_get_images(),
-            labels=_get_labels(),
-            shapes=_get_shapes(),
-            points=_get_points(),
-            table=_get_table("sample1"),
-        )
+        s = request.getfixturevalue("full_sdata")
     elif request.param == "empty":
         s = SpatialData()
     else:
@@ -120,28 +148,42 @@ def sdata(request) -> SpatialData:
     return s
 
 
+def _deepcopy_element(element: SpatialElement) -> SpatialElement:
+    if isinstance(element, MultiscaleSpatialImage):
+        # deepcopy() would return a DataTree, so the multiscale image is rebuilt from copies of its levels
+        copied = MultiscaleSpatialImage.from_dict({k: deepcopy(next(iter(v.values()))) for k, v in element.items()})
+    else:
+        copied = deepcopy(element)
+    # the transformations dict is not always deep-copied with the element (e.g. the attrs of dataframes)
+    _set_transformations(copied, deepcopy(_get_transformations(element)))
+    return copied
+
+
+def _deepcopy_sdata(sdata: SpatialData) -> SpatialData:
+    return SpatialData(
+        images={k: _deepcopy_element(v) for k, v in sdata.images.items()},
+        labels={k: _deepcopy_element(v) for k, v in sdata.labels.items()},
+        shapes={k: _deepcopy_element(v) for k, v in sdata.shapes.items()},
+        points={k: _deepcopy_element(v) for k, v in sdata.points.items()},
+        table=deepcopy(sdata.table),
+    )
+
+
 def _get_images() -> dict[str, Union[SpatialImage, MultiscaleSpatialImage]]:
     out = {}
     dims_2d = ("c", "y", "x")
     dims_3d = ("z", "y", "x", "c")
-    out["image2d"] = Image2DModel.parse(RNG.normal(size=(3, 64, 64)), dims=dims_2d)
-    out["image2d_multiscale"] = Image2DModel.parse(RNG.normal(size=(3, 64, 64)), scale_factors=[2, 2], dims=dims_2d)
-    out["image2d_xarray"] = Image2DModel.parse(DataArray(RNG.normal(size=(3, 64, 64)), dims=dims_2d), dims=None)
-    out["image2d_multiscale_xarray"] = Image2DModel.parse(
-        DataArray(RNG.normal(size=(3, 64, 64)), dims=dims_2d),
-        scale_factors=[2, 4],
-        dims=None,
-    )
-    out["image3d_numpy"] = Image3DModel.parse(RNG.normal(size=(2, 64, 64, 3)), dims=dims_3d)
-    out["image3d_multiscale_numpy"] = Image3DModel.parse(
-        RNG.normal(size=(2, 64, 64, 3)), scale_factors=[2], dims=dims_3d
-    )
-    out["image3d_xarray"] = Image3DModel.parse(DataArray(RNG.normal(size=(2, 64, 64, 3)), dims=dims_3d), dims=None)
-    out["image3d_multiscale_xarray"] = Image3DModel.parse(
-        DataArray(RNG.normal(size=(2, 64, 64, 3)), dims=dims_3d),
-        scale_factors=[2],
-        dims=None,
-    )
+    # the variants of each image share the same data: the parsers don't modify their input
+    da_2d = DataArray(_IMAGE_2D, dims=dims_2d)
+    out["image2d"] = Image2DModel.parse(_IMAGE_2D, dims=dims_2d)
+    out["image2d_multiscale"] = Image2DModel.parse(_IMAGE_2D, scale_factors=[2, 2], dims=dims_2d)
+    out["image2d_xarray"] = Image2DModel.parse(da_2d, dims=None)
+    out["image2d_multiscale_xarray"] = Image2DModel.parse(da_2d, scale_factors=[2, 4], dims=None)
+    da_3d = DataArray(_IMAGE_3D, dims=dims_3d)
+    out["image3d_numpy"] = Image3DModel.parse(_IMAGE_3D, dims=dims_3d)
+    out["image3d_multiscale_numpy"] = Image3DModel.parse(_IMAGE_3D, scale_factors=[2], dims=dims_3d)
+    out["image3d_xarray"] = Image3DModel.parse(da_3d, dims=None)
+    out["image3d_multiscale_xarray"] = Image3DModel.parse(da_3d, scale_factors=[2], dims=None)
     return out
 
 
@@ -150,73 +192,49 @@ def _get_labels() -> dict[str, Union[SpatialImage, MultiscaleSpatialImage]]:
     dims_2d = ("y", "x")
     dims_3d = ("z", "y", "x")
 
-    out["labels2d"] = Labels2DModel.parse(RNG.normal(size=(64, 64)), dims=dims_2d)
-    out["labels2d_multiscale"] = Labels2DModel.parse(RNG.normal(size=(64, 64)), scale_factors=[2, 4], dims=dims_2d)
-    out["labels2d_xarray"] = Labels2DModel.parse(DataArray(RNG.normal(size=(64, 64)), dims=dims_2d), dims=None)
+    out["labels2d"] = Labels2DModel.parse(_random_labels((64, 64)), dims=dims_2d)
+    out["labels2d_multiscale"] = Labels2DModel.parse(_random_labels((64, 64)), scale_factors=[2, 4], dims=dims_2d)
+    out["labels2d_xarray"] = Labels2DModel.parse(DataArray(_random_labels((64, 64)), dims=dims_2d), dims=None)
     out["labels2d_multiscale_xarray"] = Labels2DModel.parse(
-        DataArray(RNG.normal(size=(64, 64)), dims=dims_2d),
+        DataArray(_random_labels((64, 64)), dims=dims_2d),
         scale_factors=[2, 4],
         dims=None,
     )
-    out["labels3d_numpy"] = Labels3DModel.parse(RNG.normal(size=(10, 64, 64)), dims=dims_3d)
+    out["labels3d_numpy"] = Labels3DModel.parse(_random_labels((10, 64, 64)), dims=dims_3d)
     out["labels3d_multiscale_numpy"] = Labels3DModel.parse(
-        RNG.normal(size=(10, 64, 64)), scale_factors=[2, 4], dims=dims_3d
+        _random_labels((10, 64, 64)), scale_factors=[2, 4], dims=dims_3d
     )
-    out["labels3d_xarray"] = Labels3DModel.parse(DataArray(RNG.normal(size=(10, 64, 64)), dims=dims_3d), dims=None)
+    out["labels3d_xarray"] = Labels3DModel.parse(DataArray(_random_labels((10, 64, 64)), dims=dims_3d), dims=None)
     out["labels3d_multiscale_xarray"] = Labels3DModel.parse(
-        DataArray(RNG.normal(size=(10, 64, 64)), dims=dims_3d),
+        DataArray(_random_labels((10, 64, 64)), dims=dims_3d),
         scale_factors=[2, 4],
         dims=None,
     )
     return out
 
 
+# the vertices of the 5 test polygons, one after the other (the rings are closed by shapely)
+_POLYGONS_COORDS = np.array(
+    [
+        [0, 0], [0, 1], [1, 1], [1, 0],
+        [0, 0], [0, -1], [-1, -1], [-1, 0],
+        [0, 0], [0, 1], [1, 10],
+        [0, 0], [0, 1], [1, 1],
+        [0, 0], [0, 1], [1, 1], [1, 0], [1, 0],
+    ],
+    dtype=np.float64,
+)  # fmt: skip
+_POLYGONS_INDICES = np.repeat(np.arange(5), [4, 4, 3, 3, 5])
+
+
 def _get_shapes() -> dict[str, GeoDataFrame]:
     # TODO: add polygons from geojson and from ragged arrays since now only the GeoDataFrame initializer is tested.
     out = {}
-    poly = GeoDataFrame(
-        {
-            "geometry": [
-                Polygon(((0, 0), (0, 1), (1, 1), (1, 0))),
-                Polygon(((0, 0), (0, -1), (-1, -1), (-1, 0))),
-                Polygon(((0, 0), (0, 1), (1, 10))),
-                Polygon(((0, 0), (0, 1), (1, 1))),
-                Polygon(((0, 0), (0, 1), (1, 1), (1, 0), (1, 0))),
-            ]
-        }
-    )
-
-    multipoly = GeoDataFrame(
-        {
-            "geometry": [
-                MultiPolygon(
-                    [
-                        Polygon(((0, 0), (0, 1), (1, 1), (1, 0))),
-                        Polygon(((0, 0), (0, -1), (-1, -1), (-1, 0))),
-                    ]
-                ),
-                MultiPolygon(
-                    [
-                        Polygon(((0, 0), (0, 1), (1, 10))),
-                        Polygon(((0, 0), (0, 1), (1, 1))),
-                        Polygon(((0, 0), (0, 1), (1, 1), (1, 0), (1, 0))),
-                    ]
-                ),
-            ]
-        }
-    )
-
-    points = GeoDataFrame(
-        {
-            "geometry": [
-                Point((0, 1)),
-                Point((1, 1)),
-                Point((3, 4)),
-                Point((4, 2)),
-                Point((5, 6)),
-            ]
-        }
-    )
+    # the rings are built in a single vectorized call and shared by the polygons and the multipolygons
+    polygons = shapely.polygons(shapely.linearrings(_POLYGONS_COORDS, indices=_POLYGONS_INDICES))
+    poly = GeoDataFrame({"geometry": polygons})
+    multipoly = GeoDataFrame({"geometry": shapely.multipolygons(polygons, indices=[0, 0, 1, 1, 1])})
+    points = GeoDataFrame({"geometry": shapely.points([[0, 1], [1, 1], [3, 4], [4, 2], [5, 6]])})
     points["radius"] = np.random.normal(size=(len(points), 1))
 
     out["poly"] = ShapesModel.parse(poly)
@@ -233,15 +251,18 @@ def _get_points() -> dict[str, DaskDataFrame]:
         name = f"{name}_{i}"
         arr = RNG.normal(size=(100, 2))
         # randomly assign some values from v to the points
-        points_assignment0 = RNG.integers(0, 10, size=arr.shape[0]).astype(np.int_)
-        genes = RNG.choice(["a", "b"], size=arr.shape[0])
+        points_assignment0 = RNG.integers(0, 10, size=arr.shape[0], dtype=np.int32)
+        # categorical with string categories: the parser doesn't need to cast the values
+        genes = pd.Categorical.from_codes(RNG.integers(0, 2, size=arr.shape[0], dtype=np.int8), categories=["a", "b"])
         annotation = pd.DataFrame(
             {
                 "genes": genes,
                 "instance_id": points_assignment0,
             },
         )
-        out[name] = PointsModel.parse(arr, annotation=annotation, feature_key="genes", instance_key="instance_id")
+        points = PointsModel.parse(arr, annotation=annotation, feature_key="genes", instance_key="instance_id")
+        # persist, so that len() and shape in the tests don't re-execute the parsing graph
+        out[name] = points.persist()
     return out
 
 
@@ -253,14 +274,15 @@ def _get_table(
     if region is not None:
         region_key = region_key or "annotated_region"
         instance_key = instance_key or "instance_id"
-    adata = AnnData(RNG.normal(size=(100, 10)), obs=pd.DataFrame(RNG.normal(size=(100, 3)), columns=["a", "b", "c"]))
+    obs = pd.DataFrame(RNG.standard_normal(size=(100, 3), dtype=np.float32), columns=["a", "b", "c"], copy=False)
+    adata = AnnData(RNG.standard_normal(size=(100, 10), dtype=np.float32), obs=obs)
     if instance_key is not None:
-        adata.obs[instance_key] = np.arange(adata.n_obs)
+        adata.obs[instance_key] = np.arange(adata.n_obs, dtype=np.int32)
     if isinstance(region, str):
         return TableModel.parse(adata=adata, region=region, instance_key=instance_key)
     elif isinstance(region, list):
         adata.obs[region_key] = RNG.choice(region, size=adata.n_obs)
-        adata.obs[instance_key] = RNG.integers(0, 10, size=(100,))
+        adata.obs[instance_key] = RNG.integers(0, 10, size=(100,), dtype=np.int32)
         return TableModel.parse(adata=adata, region=region, region_key=region_key, instance_key=instance_key)
     elif region is None:
         return TableModel.parse(adata=adata)